@@ -0,0 +1,210 @@
+# Answers a batch of cheapest slot queries offline, for support tooling and load
+# testing. Reads JSONL queries like {"postcode": "LS29 8HF", "duration": 90} (an
+# optional "id" is passed through) and writes one JSONL result per query.
+#
+#   python -m octopus.bulk queries.jsonl -o results.jsonl --workers 8
+#
+# Postcodes are looked up once each, queries are grouped by distributor code, and
+# each region's rates are fetched once and used to answer all of its durations.
+
+import argparse
+import json
+import re
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import redirect_stdout
+
+from octopus.octopus import OctopusEnergy
+
+nonAlphaRE = re.compile('[^A-Z0-9]+')
+
+
+# Parse the queries file, one JSON object per line. Returns a list of query dicts,
+# each tagged with its line number, and a list of error results for bad lines.
+def readQueries(f):
+
+	queries = []
+	errors = []
+
+	for lineNo, line in enumerate(f, 1):
+		if line.strip() == '':
+			continue
+
+		try:
+			query = json.loads(line)
+		except ValueError as e:
+			errors.append({'line': lineNo, 'error': 'Bad query: {}'.format(str(e))})
+			continue
+
+		if not isinstance(query, dict):
+			errors.append({'line': lineNo, 'error': 'Bad query: expected a JSON object'})
+			continue
+
+		postcode = query.get('postcode')
+		duration = query.get('duration')
+
+		if isinstance(postcode, str):
+			postcode = nonAlphaRE.sub('', postcode.upper())
+
+		# Some JSON producers write every number as a float, so accept 60.0 as 60.
+		if isinstance(duration, float) and duration.is_integer():
+			duration = int(duration)
+
+		if not isinstance(postcode, str) or postcode == '':
+			error = 'postcode must be a non-empty string'
+		elif not isinstance(duration, int) or isinstance(duration, bool):
+			error = 'duration must be a whole number of minutes'
+		else:
+			error = None
+
+		if error is not None:
+			errors.append({'line': lineNo, 'id': query.get('id'), 'error': 'Bad query: ' + error})
+			continue
+
+		queries.append({'line': lineNo, 'id': query.get('id'), 'postcode': postcode, 'duration': duration})
+
+	return queries, errors
+
+
+# Look up the distributor code for a single postcode.
+def lookupDistributorCode(postcode, noisy=False):
+
+	o = OctopusEnergy(postcode=postcode, noisy=noisy)
+
+	# The constructor reports, rather than raises, a postcode that isn't found.
+	distributorCode = getattr(o, 'distributorCode', None)
+	if distributorCode is None:
+		raise ValueError('No distributor code found for postcode')
+
+	return distributorCode
+
+
+# Answer every duration asked of one region from a single fetch of its rates.
+def answerRegion(distributorCode, queries, productCode, noisy=False):
+
+	o = OctopusEnergy(distributorCode=distributorCode, noisy=noisy)
+	o.productCode = productCode
+
+	slots = o.getCheapestSlots([q['duration'] for q in queries])
+
+	return [result(q, distributorCode, slots[q['duration']]) for q in queries]
+
+
+# Build the output record for a query, from either a (start, end) tuple or an
+# exception.
+def result(query, distributorCode, answer):
+
+	r = dict(query)
+	r['distributorCode'] = distributorCode
+
+	if isinstance(answer, Exception):
+		r['error'] = '{}: {}'.format(type(answer).__name__, str(answer))
+	else:
+		(start, end) = answer
+		r['start'] = start.isoformat()
+		r['end'] = end.isoformat()
+
+	return r
+
+
+def writeResult(out, r):
+	out.write(json.dumps(r) + '\n')
+	out.flush()
+
+
+def run(infile, out, workers=4, noisy=False):
+
+	startTime = time.perf_counter()
+
+	queries, errors = readQueries(infile)
+	for r in errors:
+		writeResult(out, r)
+
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+
+		# Deduplicated postcode lookup.
+		lookups = {pool.submit(lookupDistributorCode, pc, noisy): pc for pc in {q['postcode'] for q in queries}}
+		distributorCodes = {}
+		for future in as_completed(lookups):
+			try:
+				distributorCodes[lookups[future]] = future.result()
+			except Exception as e:
+				distributorCodes[lookups[future]] = e
+
+		# Group by region, answering queries for unknown postcodes straight away.
+		regions = {}
+		for q in queries:
+			dc = distributorCodes[q['postcode']]
+			if isinstance(dc, Exception):
+				writeResult(out, result(q, None, dc))
+			else:
+				regions.setdefault(dc, []).append(q)
+
+		if len(regions) > 0:
+			# The product code is the same for every region, so only ask for it once.
+			try:
+				productCode = OctopusEnergy(distributorCode=next(iter(regions)), noisy=noisy).octopusGetProductCode()
+			except Exception as e:
+				print('Error: bulk: Could not get product code - {}'.format(str(e)), file=sys.stderr)
+				for dc, qs in regions.items():
+					for q in qs:
+						writeResult(out, result(q, dc, e))
+				productCode = None
+
+			if productCode is not None:
+				answers = {pool.submit(answerRegion, dc, qs, productCode, noisy): dc for dc, qs in regions.items()}
+				for future in as_completed(answers):
+					dc = answers[future]
+					try:
+						rs = future.result()
+					except Exception as e:
+						print('Error: bulk: Could not answer queries for region {} - {}'.format(dc, str(e)), file=sys.stderr)
+						rs = [result(q, dc, e) for q in regions[dc]]
+
+					for r in rs:
+						writeResult(out, r)
+
+	elapsed = time.perf_counter() - startTime
+	total = len(queries) + len(errors)
+	print('{} queries in {} regions, {:.2f}s, {:.1f} queries/s'.format(total, len(regions), elapsed, total / elapsed if elapsed > 0 else 0), file=sys.stderr)
+
+	return total
+
+
+def positiveInt(value):
+
+	try:
+		n = int(value)
+	except ValueError:
+		n = 0
+
+	if n < 1:
+		raise argparse.ArgumentTypeError('{} is not a positive whole number'.format(value))
+
+	return n
+
+
+def main(argv=None):
+
+	parser = argparse.ArgumentParser(description='Answer a JSONL batch of cheapest slot queries.')
+	parser.add_argument('queries', nargs='?', type=argparse.FileType('r'), default='-', help='JSONL file of {"postcode", "duration"} queries, or - for stdin')
+	parser.add_argument('-o', '--output', type=argparse.FileType('w'), default='-', help='JSONL file to write results to, or - for stdout')
+	parser.add_argument('-w', '--workers', type=positiveInt, default=4, help='number of regions to process in parallel')
+	parser.add_argument('--noisy', action='store_true', help='print debug information')
+	args = parser.parse_args(argv)
+
+	# OctopusEnergy prints its diagnostics, keep them out of the results.
+	try:
+		with redirect_stdout(sys.stderr):
+			run(args.queries, args.output, workers=args.workers, noisy=args.noisy)
+	finally:
+		if args.queries is not sys.stdin:
+			args.queries.close()
+		if args.output is not sys.stdout:
+			args.output.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -77,7 +77,7 @@ class OctopusEnergy:
 			try:
 				self.distributorCode = self.octopusGetDistributorCode(self.postcode)
 			except APIError as e:
-				print("Debug: OctopusEnergy: Error calling Octopus Energy API to get distributor code - {}".format(string(e)))
+				print("Debug: OctopusEnergy: Error calling Octopus Energy API to get distributor code - {}".format(str(e)))
 				raise
 			except PostcodeError as e:
 				print("Debug: OctopusEnergy: Error in postcode - {}".format(str(e)))
@@ -125,7 +125,7 @@ class OctopusEnergy:
 			resp = requests.get(url, params={'postcode': postcode})
 		except requests.exceptions.RequestException as e:
 			print("Error: couldn't retrieve distributor code for postcode=|{}| ".format(postcode))
-			raise APIError(string(e))
+			raise APIError(str(e))
 			
 		try:
 			results = resp.json()['results']
@@ -315,35 +315,89 @@ class OctopusEnergy:
 		
 		return self.tariffCosts
 
+	# Returns the number of half hour slots needed for a slot of mins minutes, which
+	# is at least one. Raises RequestedSlotTooLongError if it's longer than we can
+	# answer, given rateCount half hourly rates. With no rateCount, only the 40 hour
+	# limit is checked.
+	def slotCount(mins, rateCount=None):
+
+		# Minimum time slot.
+		if mins < 30:
+			mins = 30
+
+		# We don't have data for requests longer than 40 hours, and it's meaningless to
+		# find a slot taking up more than 80% of the time for which there is data.
+		if mins > 40*60 or (rateCount is not None and mins > rateCount * 30 * .8):
+			raise RequestedSlotTooLongError('{} minutes is longer than the tariff data allows'.format(mins))
+
+		return round(mins/30)
+
 	# Get the cheapest x minute slot
 	def getCheapestSlot(self, mins):
 	
 		if self.noisy:
 			print('Debug: OctopusEnergy: Calculating cheapest {} minute time slot'.format(mins))
-			
-		# Minimum time slot.
-		if mins < 30:
-			mins = 30
 
-		# We don't have data for requests longer than 40 hours, so no point looking it up
-		if mins > 40*60:
-			raise RequestedSlotTooLongError
+		# No point looking the costs up for a slot we could never answer.
+		OctopusEnergy.slotCount(mins)
 
 		costs = self.octopusGetTariffCosts(self.nowUntilTomorrow()).copy()
-		
-		# Meaningless to find a slot taking up more than 80% of the time for which there
-		# is data.
-		if mins > len(costs) * 30 * .8:
-			raise RequestedSlotTooLongError
-			
-		slots = round(mins/30)
+
+		slots = OctopusEnergy.slotCount(mins, len(costs))
 		
 		if slots > 1:
-			c = costs['value_inc_vat'].rolling(slots).mean().dropna().sort_values().head(n=1)
+			c = costs['value_inc_vat'].rolling(slots).mean().dropna()
 		else:
-			c = costs['value_inc_vat'].sort_values().head(n=1)
+			c = costs['value_inc_vat']
+
+		# Prices are compared to 6 decimal places, and a tie goes to the earliest slot.
+		# getCheapestSlots() does the same, so the two always agree.
+		c = c.round(6)
+		c = c[c == c.min()].sort_index().head(n=1)
 				
 		return(c.index[0].to_pydatetime(), (c.index[0] + dt.timedelta(minutes=slots*30)).to_pydatetime())
+
+	# Get the cheapest slot for each of a list of durations in one pass over the
+	# tariff costs. Returns a dict keyed by the requested minutes, holding either a
+	# (start, end) tuple or the RequestedSlotTooLongError for that duration.
+	def getCheapestSlots(self, minsList):
+
+		if self.noisy:
+			print('Debug: OctopusEnergy: Calculating cheapest slots for {} durations'.format(len(set(minsList))))
+
+		costs = self.octopusGetTariffCosts(self.nowUntilTomorrow()).sort_index()
+		prices = costs['value_inc_vat'].values.astype(float)
+		n = len(prices)
+
+		results = {}
+		slotsFor = {}
+
+		for mins in set(minsList):
+			try:
+				slotsFor[mins] = OctopusEnergy.slotCount(mins, n)
+			except RequestedSlotTooLongError as e:
+				results[mins] = e
+
+		if len(slotsFor) == 0:
+			return results
+
+		# Mean price of every window of every requested length, from a running total.
+		# Windows running off the end of the data are never the cheapest. As in
+		# getCheapestSlot(), means are rounded to 6 decimal places and argmin picks
+		# the earliest of any tied windows.
+		slotCounts = np.array(sorted(set(slotsFor.values())))
+		cumulative = np.concatenate(([0.0], np.cumsum(prices)))
+		starts = np.arange(n)
+		ends = starts[np.newaxis, :] + slotCounts[:, np.newaxis]
+		sums = cumulative[np.minimum(ends, n)] - cumulative[starts]
+		means = np.where(ends <= n, np.round(sums / slotCounts[:, np.newaxis], 6), np.inf)
+		cheapest = dict(zip(slotCounts.tolist(), means.argmin(axis=1).tolist()))
+
+		for mins, slots in slotsFor.items():
+			start = costs.index[cheapest[slots]]
+			results[mins] = (start.to_pydatetime(), (start + dt.timedelta(minutes=slots*30)).to_pydatetime())
+
+		return results
 			
 if __name__ == '__main__':
 
@@ -0,0 +1,176 @@
+# This exercises the cheapest slot calculations and the octopus.bulk tool against
+# made up API responses, so it needs no network. Run it with the lambda folder on
+# the path, e.g. PYTHONPATH=lambda python offline_smoketest.py
+#
+# Any failure raises an AssertionError, so the run exits non-zero.
+
+import datetime as dt
+import io
+import json
+import threading
+
+from collections import Counter
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from pytz import timezone
+
+import octopus.octopus
+from octopus import bulk
+from octopus.octopus import OctopusEnergy, RequestedSlotTooLongError
+
+utc = timezone('UTC')
+
+
+# Half hourly costs starting at midnight, newest first like the API returns them.
+def makeCosts(prices):
+	start = dt.datetime(2019, 6, 1, 0, 0, tzinfo=utc)
+	return pd.DataFrame({
+		'valid_from': [start + dt.timedelta(minutes=30*i) for i in reversed(range(len(prices)))],
+		'value_inc_vat': list(reversed(prices)),
+	}).set_index('valid_from')
+
+
+def cheapestOrError(f):
+	try:
+		return f()
+	except RequestedSlotTooLongError:
+		return 'too long'
+
+
+# The skill gives a tie to the earliest slot.
+o = OctopusEnergy(distributorCode='_M')
+o.tariffCosts = makeCosts([5.0, 1.0, 1.0, 3.0, 1.0, 1.0, 5.0, 5.0, 5.0, 5.0])
+(start, end) = o.getCheapestSlot(60)
+assert (start.hour, start.minute, end.hour, end.minute) == (0, 30, 1, 30), (start, end)
+(start, end) = o.getCheapestSlot(30)
+assert (start.hour, start.minute) == (0, 30), start
+
+# getCheapestSlots() (used by octopus.bulk) must always agree with getCheapestSlot()
+# (used by the skill). The made up prices have lots of ties.
+rng = np.random.RandomState(0)
+mismatches = 0
+for series in range(300):
+	n = rng.randint(10, 96)
+
+	o = OctopusEnergy(distributorCode='_M')
+	o.tariffCosts = makeCosts(list(rng.randint(0, 4, n) * 1.05))
+
+	durations = [0, 15, 30, 45, 75, 90, 240, int(n * 30 * .8) + 30]
+	batch = o.getCheapestSlots(durations)
+	for mins in durations:
+		single = cheapestOrError(lambda: o.getCheapestSlot(mins))
+		if isinstance(batch[mins], RequestedSlotTooLongError):
+			batch[mins] = 'too long'
+		if single != batch[mins]:
+			mismatches += 1
+			print('Mismatch for {}m on {} prices: {} vs {}'.format(mins, n, single, batch[mins]))
+
+assert mismatches == 0, '{} mismatches between getCheapestSlots() and getCheapestSlot()'.format(mismatches)
+print('getCheapestSlots() agrees with getCheapestSlot() on 300 series')
+
+
+# Made up Octopus API, counting the calls made to each endpoint.
+class FakeResponse:
+
+	def __init__(self, data):
+		self.data = data
+
+	def json(self):
+		return self.data
+
+
+class FakeAPI:
+
+	regions = {'LS298HF': ['_B'], 'SW1A1AA': ['_C'], 'LS': ['_B', '_C']}
+
+	def __init__(self, products=None):
+		self.calls = Counter()
+		self.lock = threading.Lock()
+		if products is None:
+			products = [{'code': 'AGILE-18-02-21', 'direction': 'IMPORT'}]
+		self.products = products
+
+	def get(self, url, params=None):
+
+		path = url[len(OctopusEnergy.baseURL):]
+
+		if path == 'industry/grid-supply-points/':
+			endpoint = 'grid-supply-points'
+			data = {'results': [{'group_id': g} for g in self.regions.get(params['postcode'], [])]}
+		elif path == 'products/':
+			endpoint = 'products'
+			data = {'results': self.products}
+		elif path.endswith('/standard-unit-rates/'):
+			endpoint = 'standard-unit-rates'
+			region = path.split('/')[-3][-1]
+			start = dt.datetime(2019, 6, 1, 0, 0, tzinfo=utc)
+			prices = [float((i * (3 if region == 'B' else 5)) % 7) for i in range(60)]
+			data = {'next': None, 'results': [{
+				'valid_from': (start + dt.timedelta(minutes=30*i)).isoformat(),
+				'valid_to': (start + dt.timedelta(minutes=30*(i+1))).isoformat(),
+				'value_exc_vat': prices[i] / 1.05,
+				'value_inc_vat': prices[i],
+			} for i in reversed(range(60))]}
+		else:
+			endpoint = 'tariff'
+			data = {'single_register_electricity_tariffs': {g: {'direct_debit_monthly': {'code': 'E-1R-AGILE-18-02-21-' + g[1]}} for g in ['_B', '_C']}}
+
+		with self.lock:
+			self.calls[endpoint] += 1
+
+		return FakeResponse(data)
+
+
+def runBulk(queries, api):
+	out = io.StringIO()
+	with mock.patch.object(octopus.octopus.requests, 'get', api.get):
+		total = bulk.run(io.StringIO('\n'.join(queries) + '\n'), out, workers=3)
+	assert total == len(queries), total
+	return {r['line']: r for r in map(json.loads, out.getvalue().splitlines())}
+
+
+queries = [
+	'{"id": "a", "postcode": "LS29 8HF", "duration": 90}',
+	'{"id": "b", "postcode": "ls298hf", "duration": 60.0}',
+	'{"id": "c", "postcode": "SW1A 1AA", "duration": 120}',
+	'{"id": "d", "postcode": "ZZ99 9ZZ", "duration": 90}',
+	'{"id": "e", "postcode": "LS", "duration": 90}',
+	'[1, 2, 3]',
+	'{"id": "g", "postcode": "LS29',
+	'{"id": "h", "postcode": "SW1A 1AA", "duration": 5000}',
+]
+
+api = FakeAPI()
+results = runBulk(queries, api)
+
+# Each postcode looked up once, product code once, then tariff code and rates once
+# per region.
+assert api.calls == Counter({'grid-supply-points': 4, 'products': 1, 'tariff': 2, 'standard-unit-rates': 2}), api.calls
+
+assert len(results) == len(queries), results
+assert results[1]['distributorCode'] == '_B' and (results[1]['start'], results[1]['end']) == ('2019-06-01T02:30:00+00:00', '2019-06-01T04:00:00+00:00'), results[1]
+assert results[2]['distributorCode'] == '_B' and results[2]['duration'] == 60 and 'start' in results[2], results[2]
+assert results[3]['distributorCode'] == '_C' and 'start' in results[3], results[3]
+assert results[4]['id'] == 'd' and results[4]['error'] == 'ValueError: No distributor code found for postcode', results[4]
+assert results[5]['id'] == 'e' and results[5]['error'].startswith('PostcodeAmbiguous:'), results[5]
+assert results[6] == {'line': 6, 'error': 'Bad query: expected a JSON object'}, results[6]
+assert results[7]['error'].startswith('Bad query:') and 'id' not in results[7], results[7]
+assert results[8]['id'] == 'h' and results[8]['error'].startswith('RequestedSlotTooLongError: 5000 minutes'), results[8]
+
+# The answers are the same as asking the skill's way.
+o = OctopusEnergy(distributorCode='_B')
+with mock.patch.object(octopus.octopus.requests, 'get', FakeAPI().get):
+	(start, end) = o.getCheapestSlot(90)
+assert (results[1]['start'], results[1]['end']) == (start.isoformat(), end.isoformat()), (results[1], start, end)
+
+# With no product code, every query that found a region still gets a record.
+api = FakeAPI(products=[])
+results = runBulk(queries, api)
+assert len(results) == len(queries), results
+for line in [1, 2, 3, 8]:
+	assert results[line]['error'].startswith('APIError:'), results[line]
+assert api.calls == Counter({'grid-supply-points': 4, 'products': 1}), api.calls
+
+print('octopus.bulk answered {} queries as expected'.format(len(queries)))